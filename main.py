@@ -1,79 +1,327 @@
 import streamlit as st
-from crtsh import crtshAPI
 import pandas as pd
 import asyncio
+import concurrent.futures
+import io
+import queue
+import re
+import socket
+import sys
+import threading
+import time
+from collections import deque
+import aiodns
 import aiohttp
+import orjson
 
-async def check_subdomain(session, subdomain):
+if sys.platform != "win32":
+    import uvloop
+
+MAX_CONCURRENCY = 200
+N_WORKERS = MAX_CONCURRENCY
+DNS_CONCURRENCY = 500
+# Seconds the script thread waits on the shared loop before checking for a stop or rerun.
+POLL_INTERVAL = 0.2
+# Number of recent progress samples the ETA is averaged over.
+ETA_WINDOW = 20
+CRTSH_URL = "https://crt.sh/"
+# crt.sh routinely takes far longer than a single probe, so it gets its own timeout.
+CRTSH_TIMEOUT = aiohttp.ClientTimeout(total=120)
+
+# Status codes: a positive value is the HTTP status of a live host, a negated
+# HTTP status is an HTTP error, and the remaining values are failure categories.
+STATUS_ERROR = 0
+STATUS_DNS = -1
+STATUS_LABEL = {STATUS_ERROR: "Down (Error)", STATUS_DNS: "Down (DNS)"}
+
+def status_labels(codes):
+    """
+    Returns the human-readable statuses for a Series of status codes.
+    """
+    labels = codes.map(STATUS_LABEL)
+    is_http = labels.isna()
+    live = is_http & (codes > 0)
+    down = is_http & (codes < 0)
+    labels[live] = "Live (" + codes[live].astype(str) + ")"
+    labels[down] = "Down (" + (-codes[down]).astype(str) + ")"
+    return labels
+
+async def check_subdomain(session, subdomain, verbose=False):
     """
     Asynchronously checks a single subdomain and records error details if any.
+    Returns a (subdomain, status code, error) tuple. Errors are short tags
+    unless verbose is set, in which case the full exception message is kept.
     """
     url = f"http://{subdomain}"
     try:
-        async with session.get(url, timeout=3) as response:
-            if response.status < 400:
-                return {"Subdomain": subdomain, "Status": f"Live ({response.status})", "Error": ""}
-            else:
-                return {"Subdomain": subdomain, "Status": f"Down ({response.status})", "Error": f"HTTP Error {response.status}"}
+        # Only the status is needed, so HEAD avoids downloading the body.
+        async with session.head(url, allow_redirects=False) as response:
+            status = response.status
+        if status == 405:
+            async with session.get(url, allow_redirects=False) as response:
+                status = response.status
+        if status < 400:
+            return (subdomain, status, "")
+        else:
+            return (subdomain, -status, f"HTTP Error {status}")
+    except asyncio.TimeoutError as e:
+        return (subdomain, STATUS_ERROR, str(e) if verbose else "timeout")
+    except aiohttp.ClientConnectorError as e:
+        return (subdomain, STATUS_ERROR, str(e) if verbose else "conn")
     except Exception as e:
-        return {"Subdomain": subdomain, "Status": "Down (Error)", "Error": str(e)}
+        return (subdomain, STATUS_ERROR, str(e) if verbose else type(e).__name__)
+
+async def query_crtsh(session, domain):
+    """
+    Fetches the certificate entries for a domain and its subdomains from crt.sh.
+    """
+    params = {"q": f"%.{domain}", "output": "json"}
+    async with session.get(CRTSH_URL, params=params, timeout=CRTSH_TIMEOUT) as response:
+        response.raise_for_status()
+        body = await response.read()
+    return orjson.loads(body)
+
+@st.cache_data(ttl=600)
+def fetch_crtsh(domain):
+    """
+    Queries crt.sh for a domain, memoized so repeated searches skip the network.
+    Raises ValueError on an empty result so failures are never cached.
+    """
+    data = run_on_shared_loop(query_crtsh(get_session(), domain))
+    if not data:
+        raise ValueError(f"No data returned from crt.sh for {domain}")
+    return data
+
+def extract_subdomains(data, domain):
+    """
+    Extracts the unique names ending in the given domain from crt.sh entries.
+    """
+    # 'name_value' may contain multiple subdomains separated by newlines, so match
+    # line by line over a single blob instead of looping over each name in Python.
+    # Names are case-folded and leading '*.' wildcards dropped so duplicates are probed once.
+    blob = "\n".join(entry["name_value"] for entry in data).casefold()
+    domain_cf = domain.casefold()
+    pattern = re.compile(rf"(?m)^[^\S\n]*(?:\*\.)*((?:[a-z0-9_-]+\.)*{re.escape(domain_cf)})[^\S\n]*$")
+    return set(pattern.findall(blob))
 
-async def perform_http_checks(subdomain_list, progress_callback):
+async def prefilter_dns(resolver, subdomain_list):
+    """
+    Resolves subdomains in parallel so names that do not exist skip the HTTP check.
+    Returns the names to probe and the names that failed with NXDOMAIN.
+    """
+    sem = asyncio.Semaphore(DNS_CONCURRENCY)
+
+    async def resolve(sub):
+        async with sem:
+            try:
+                # Same family as the connector's lookups, so those are answered from the
+                # shared c-ares channel's cache instead of being queried again.
+                await resolver.resolve(sub, 0, socket.AF_UNSPEC)
+            except OSError as e:
+                cause = e.__cause__
+                if isinstance(cause, aiodns.error.DNSError) and cause.args[0] == aiodns.error.ARES_ENOTFOUND:
+                    return False
+            return True
+
+    resolved = await asyncio.gather(*(resolve(sub) for sub in subdomain_list))
+    to_check = []
+    dns_failures = []
+    for sub, ok in zip(subdomain_list, resolved):
+        (to_check if ok else dns_failures).append(sub)
+    return to_check, dns_failures
+
+@st.cache_resource
+def get_event_loop():
+    """
+    Returns a long-lived event loop shared across Streamlit reruns, running on a daemon thread.
+    The cached session is bound to this loop, so all checks must run on it.
+    """
+    if sys.platform != "win32":
+        loop = uvloop.new_event_loop()
+    else:
+        loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+async def _build_resolver():
+    return aiohttp.AsyncResolver()
+
+@st.cache_resource
+def get_resolver():
+    """
+    Returns the DNS resolver shared by the DNS pre-filter and the session's connector.
+    """
+    return run_on_shared_loop(_build_resolver())
+
+async def _build_session(resolver):
+    # Bound open sockets and DNS lookups instead of relying on aiohttp's implicit defaults.
+    # AsyncResolver resolves through c-ares rather than the loop's thread-pool getaddrinfo.
+    connector = aiohttp.TCPConnector(
+        resolver=resolver,
+        use_dns_cache=True,
+        ttl_dns_cache=600,
+        limit=MAX_CONCURRENCY,
+        limit_per_host=4,
+    )
+    # A single session-wide timeout avoids rebuilding a ClientTimeout on every request.
+    timeout = aiohttp.ClientTimeout(total=5, sock_connect=2, sock_read=1)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+@st.cache_resource
+def get_session():
+    """
+    Returns a ClientSession cached across reruns so keep-alive sockets and the DNS cache are reused.
+    """
+    return run_on_shared_loop(_build_session(get_resolver()))
+
+def run_on_shared_loop(coro, on_poll=None):
+    """
+    Runs a coroutine to completion on the shared event loop and returns its result.
+    Concurrent sessions submit to the same loop, so their work interleaves rather than queues.
+    The coroutine is cancelled if the script run is stopped or rerun while waiting.
+    on_poll, if given, is called on the script thread between waits.
+    """
+    future = asyncio.run_coroutine_threadsafe(coro, get_event_loop())
+    try:
+        while True:
+            try:
+                return future.result(timeout=POLL_INTERVAL)
+            except concurrent.futures.TimeoutError:
+                if on_poll is not None:
+                    on_poll()
+                # Session state access is a Streamlit yield point, so a pending stop or
+                # rerun is raised here on the script thread.
+                "_poll" in st.session_state
+    finally:
+        future.cancel()
+
+async def perform_http_checks(session, subdomain_list, progress_callback, verbose=False):
     """
     Performs asynchronous HTTP checks on a list of subdomains and updates progress.
+    progress_callback receives the completed fraction and an ETA in seconds. It is
+    called from a consumer thread, so it must not touch Streamlit elements.
+    Returns parallel lists of subdomains, status codes and errors.
     """
-    results = []
-    async with aiohttp.ClientSession() as session:
-        tasks = [check_subdomain(session, sub) for sub in subdomain_list]
-        total = len(tasks)
-        for i, future in enumerate(asyncio.as_completed(tasks)):
-            result = await future
-            results.append(result)
-            progress_callback((i + 1) / total)
-    return results
+    total = len(subdomain_list)
+    # Columns are preallocated and filled by index rather than collecting one dict per probe.
+    subs = [None] * total
+    statuses = [0] * total
+    errs = [""] * total
+    if not total:
+        return subs, statuses, errs
+    pending = asyncio.Queue()
+    for item in enumerate(subdomain_list):
+        pending.put_nowait(item)
+    # Results are handed to a consumer thread so list growth and progress stay off the loop.
+    completed = queue.SimpleQueue()
+    loop = asyncio.get_running_loop()
+    consumed = loop.create_future()
+    # Each progress update is a websocket message, so only emit one every ~0.5%.
+    emit_every = max(1, total // 200)
+
+    def consume():
+        tasks_completed = 0
+        last_emit = 0
+        # (completed, timestamp) samples taken only when progress is emitted; the ETA uses
+        # the recent completion rate so early stragglers do not skew it for the whole run.
+        ring = deque([(0, time.perf_counter())], maxlen=ETA_WINDOW)
+        try:
+            while True:
+                item = completed.get()
+                if item is None:
+                    return
+                i, (subs[i], statuses[i], errs[i]) = item
+                tasks_completed += 1
+                if tasks_completed - last_emit >= emit_every or tasks_completed == total:
+                    last_emit = tasks_completed
+                    now = time.perf_counter()
+                    oldest_completed, oldest_time = ring[0]
+                    ring.append((tasks_completed, now))
+                    remaining_tasks = total - tasks_completed
+                    eta = remaining_tasks * (now - oldest_time) / (tasks_completed - oldest_completed)
+                    progress_callback(tasks_completed / total, eta)
+        finally:
+            loop.call_soon_threadsafe(lambda: consumed.done() or consumed.set_result(None))
+
+    async def worker():
+        # A fixed pool of long-lived workers keeps O(workers) tasks alive instead of O(N).
+        while True:
+            try:
+                i, sub = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            completed.put((i, await check_subdomain(session, sub, verbose)))
+
+    # A dedicated thread per scan, so concurrent scans never wait on the loop's shared executor.
+    threading.Thread(target=consume, daemon=True).start()
+    try:
+        await asyncio.gather(*(worker() for _ in range(min(N_WORKERS, total))))
+    finally:
+        # Stop the consumer even when the scan is cancelled.
+        completed.put(None)
+    await consumed
+    return subs, statuses, errs
 
 def main():
     st.title("Subdomain Finder")
     st.write("This tool searches crt.sh for subdomains of a given domain and then performs HTTP checks to determine if they are online. Searches are dependent on crt.sh, they somtimes may fail, try another domain then try again if this happens.")
     
     domain = st.text_input("Enter a naked domain (e.g. example.com):")
+    verbose = st.checkbox("Show full error messages")
     
     if st.button("Search") and domain:
         with st.spinner(text=f"Searching for subdomains of {domain}... This can take a while."):
             try:
-                data = crtshAPI().search(domain)
+                try:
+                    data = fetch_crtsh(domain)
+                except (aiohttp.ClientError, asyncio.TimeoutError, ValueError):
+                    # Failures raise rather than return so they are not cached.
+                    data = None
                 if not data:
                     st.error("No data returned from crt.sh. The domain may not have any certificate records or the API might be unavailable. (Try another domain and then try again)")
                     return
                 
-                subdomains = set()
-                for entry in data:
-                    # 'name_value' may contain multiple subdomains separated by newlines.
-                    names = entry.get("name_value", "").splitlines()
-                    for sub in names:
-                        sub = sub.strip()
-                        if sub.endswith(domain):
-                            subdomains.add(sub)
-                subdomain_list = list(subdomains)
+                subdomain_list = list(extract_subdomains(data, domain))
                 st.write(f"Found {len(subdomain_list)} unique subdomains.")
                 
                 progress_bar = st.progress(0)
-                def update_progress(value):
-                    progress_bar.progress(value)
+                progress = {}
+                def update_progress(value, eta):
+                    # Called from the scan's consumer thread; the bar is redrawn on the script thread.
+                    progress["latest"] = (value, eta)
+                def draw_progress():
+                    latest = progress.pop("latest", None)
+                    if latest is not None:
+                        value, eta = latest
+                        progress_bar.progress(value, text=f"Checking subdomains... ETA {eta:.0f}s")
                 
+                # Skip HTTP entirely for names that do not resolve.
+                to_check, dns_failures = run_on_shared_loop(prefilter_dns(get_resolver(), subdomain_list))
                 # Perform asynchronous HTTP checks.
-                results = asyncio.run(perform_http_checks(subdomain_list, update_progress))
-                # Prepare online results without error details.
-                online_results = [{"Subdomain": res["Subdomain"], "Status": res["Status"]} 
-                                  for res in results if "Live" in res["Status"]]
-                # Offline results include error details.
-                offline_results = [res for res in results if "Down" in res["Status"]]
+                # Streamlit owns the session lifetime, so it is not closed here.
+                session = get_session()
+                subs, statuses, errs = run_on_shared_loop(
+                    perform_http_checks(session, to_check, update_progress, verbose),
+                    on_poll=draw_progress,
+                )
+                draw_progress()
+                df = pd.DataFrame({
+                    "Subdomain": subs + dns_failures,
+                    "Status": statuses + [STATUS_DNS] * len(dns_failures),
+                    "Error": errs + ["NXDOMAIN"] * len(dns_failures),
+                })
+                mask = df["Status"] > 0
+                df["Status"] = status_labels(df["Status"])
+                # Online results without error details; offline results include them.
+                df_online = df.loc[mask, ["Subdomain", "Status"]].reset_index(drop=True)
+                df_offline = df.loc[~mask].reset_index(drop=True)
                 
                 st.subheader("Online Subdomains")
-                if online_results:
-                    df_online = pd.DataFrame(online_results)
+                if not df_online.empty:
                     st.write(df_online)
-                    csv_online = df_online.to_csv(index=False).encode("utf-8")
+                    buf = io.BytesIO()
+                    df_online.to_csv(buf, index=False, encoding="utf-8")
+                    csv_online = buf.getvalue()
                     st.download_button(
                         label="Download Online CSV",
                         data=csv_online,
@@ -84,10 +332,11 @@ def main():
                     st.write("No online subdomains found.")
                 
                 st.subheader("Offline Subdomains")
-                if offline_results:
-                    df_offline = pd.DataFrame(offline_results)
+                if not df_offline.empty:
                     st.write(df_offline)
-                    csv_offline = df_offline.to_csv(index=False).encode("utf-8")
+                    buf = io.BytesIO()
+                    df_offline.to_csv(buf, index=False, encoding="utf-8")
+                    csv_offline = buf.getvalue()
                     st.download_button(
                         label="Download Offline CSV",
                         data=csv_offline,